@@ -25,6 +25,17 @@ logging.getLogger('ulog').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
+def parse_cpu_list(value):
+    """Parse a comma-separated list of CPU indices into a set of ints."""
+    try:
+        cpus = {int(cpu) for cpu in value.split(',') if cpu.strip()}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid CPU list: {value!r}")
+    if not cpus or min(cpus) < 0:
+        raise argparse.ArgumentTypeError(f"invalid CPU list: {value!r}")
+    return cpus
+
+
 def parse_args():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(
@@ -90,6 +101,21 @@ def parse_args():
         default=30,
         help='Seconds between video status reports (default: 30)'
     )
+    parser.add_argument(
+        '--video-cpus',
+        type=parse_cpu_list,
+        metavar='LIST',
+        default=None,
+        help='Comma-separated CPU indices to pin GStreamer to, e.g. 2,3 (Linux, uses taskset)'
+    )
+    parser.add_argument(
+        '--video-rt-priority',
+        type=int,
+        choices=range(1, 100),
+        metavar='PRIO',
+        default=None,
+        help='SCHED_FIFO priority 1-99 for GStreamer (Linux, uses chrt; needs CAP_SYS_NICE)'
+    )
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -123,7 +149,9 @@ def main():
             srt_port=args.srt_port,
             auto_reconnect=not args.no_auto_reconnect,
             health_check_interval=args.health_check_interval,
-            video_stats_interval=args.video_stats_interval
+            video_stats_interval=args.video_stats_interval,
+            video_cpus=args.video_cpus,
+            video_rt_priority=args.video_rt_priority
         )
         
         forwarder.run(
@@ -7,7 +7,26 @@ KLV (Key-Length-Value) is a binary encoding standard used for metadata.
 
 import struct
 import math
-from typing import Dict, Any, Optional
+from typing import Dict, Any
+
+
+# Valid value ranges (min, max) used by encode_telemetry_to_klv to skip
+# out-of-range telemetry fields. Both bounds are inclusive, except the
+# altitude maximum, which is exclusive (6553.5 m does not fit the 2-byte
+# value scaled by 10).
+LATITUDE_RANGE = (-90.0, 90.0)
+LONGITUDE_RANGE = (-180.0, 180.0)
+ALTITUDE_RANGE = (0.0, 6553.5)      # max exclusive
+ROLL_RANGE = (-180.0, 180.0)
+PITCH_RANGE = (-90.0, 90.0)
+HEADING_RANGE = (0.0, 360.0)
+
+# Precompiled packers for the fixed-width MISB 0601 value encodings
+_pack_uint64 = struct.Struct('>Q').pack
+_pack_int32 = struct.Struct('>i').pack
+_pack_int16 = struct.Struct('>h').pack
+_pack_uint16 = struct.Struct('>H').pack
+_pack_float32 = struct.Struct('>f').pack
 
 
 class MISB0601Encoder:
@@ -48,6 +67,9 @@ class MISB0601Encoder:
     TAG_GIMBAL_ABS_PITCH = 106  # Gimbal absolute pitch (degrees)
     TAG_GIMBAL_ABS_ROLL = 107   # Gimbal absolute roll (degrees)
     
+    # One encoder is created per telemetry frame; avoid a per-instance __dict__
+    __slots__ = ('items',)
+    
     def __init__(self):
         """Initialize the MISB 0601 encoder."""
         self.items = []
@@ -64,7 +86,7 @@ class MISB0601Encoder:
             timestamp_us: Unix timestamp in microseconds
         """
         # Encode as 8-byte unsigned integer
-        value = struct.pack('>Q', timestamp_us)
+        value = _pack_uint64(timestamp_us)
         self.items.append((self.TAG_UNIX_TIMESTAMP, value))
     
     def add_latitude(self, latitude: float):
@@ -80,7 +102,7 @@ class MISB0601Encoder:
         
         # Encode as 4-byte signed integer (scaled by 1e7)
         scaled = int(latitude * 1e7)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_SENSOR_LATITUDE, value))
     
     def add_longitude(self, longitude: float):
@@ -96,7 +118,7 @@ class MISB0601Encoder:
         
         # Encode as 4-byte signed integer (scaled by 1e7)
         scaled = int(longitude * 1e7)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_SENSOR_LONGITUDE, value))
     
     def add_altitude(self, altitude: float):
@@ -106,9 +128,9 @@ class MISB0601Encoder:
         Args:
             altitude: Altitude in meters above MSL
         """
-        # Encode as 2-byte unsigned integer (scaled by 10)
-        scaled = int(altitude * 10)
-        value = struct.pack('>H', scaled & 0xFFFF)
+        # Encode as 2-byte unsigned integer (scaled by 10), clamped to the field range
+        scaled = min(max(int(altitude * 10), 0), 0xFFFF)
+        value = _pack_uint16(scaled)
         self.items.append((self.TAG_SENSOR_TRUE_ALT, value))
     
     def add_roll(self, roll: float):
@@ -120,7 +142,7 @@ class MISB0601Encoder:
         """
         # Encode as 2-byte signed integer (scaled by 100)
         scaled = int(roll * 100)
-        value = struct.pack('>h', scaled)
+        value = _pack_int16(scaled)
         self.items.append((self.TAG_PLATFORM_ROLL, value))
     
     def add_pitch(self, pitch: float):
@@ -132,7 +154,7 @@ class MISB0601Encoder:
         """
         # Encode as 2-byte signed integer (scaled by 100)
         scaled = int(pitch * 100)
-        value = struct.pack('>h', scaled)
+        value = _pack_int16(scaled)
         self.items.append((self.TAG_PLATFORM_PITCH, value))
     
     def add_heading(self, heading: float):
@@ -142,9 +164,9 @@ class MISB0601Encoder:
         Args:
             heading: Heading angle in degrees (0 to 360)
         """
-        # Encode as 2-byte unsigned integer (scaled by 100)
-        scaled = int(heading * 100)
-        value = struct.pack('>H', scaled & 0xFFFF)
+        # Encode as 2-byte unsigned integer (scaled by 100), clamped to the field range
+        scaled = min(max(int(heading * 100), 0), 0xFFFF)
+        value = _pack_uint16(scaled)
         self.items.append((self.TAG_PLATFORM_HEADING, value))
     
     # --- NEW: METHODS FOR GIMBAL AND CAMERA PARAMETERS ---
@@ -158,7 +180,7 @@ class MISB0601Encoder:
         """
         # Encode as 4-byte signed integer (scaled by 1e6)
         scaled = int(roll * 1e6)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_SENSOR_REL_ROLL, value))
     
     def add_sensor_relative_pitch(self, pitch: float):
@@ -170,7 +192,7 @@ class MISB0601Encoder:
         """
         # Encode as 4-byte signed integer (scaled by 1e6)
         scaled = int(pitch * 1e6)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_SENSOR_REL_PITCH, value))
     
     def add_sensor_relative_yaw(self, yaw: float):
@@ -182,7 +204,7 @@ class MISB0601Encoder:
         """
         # Encode as 4-byte signed integer (scaled by 1e6)
         scaled = int(yaw * 1e6)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_SENSOR_REL_YAW, value))
     
     def add_sensor_h_fov(self, fov: float):
@@ -192,9 +214,9 @@ class MISB0601Encoder:
         Args:
             fov: Horizontal field of view in degrees (0 to 180)
         """
-        # Encode as 2-byte unsigned integer (scaled by 100)
-        scaled = int(fov * 100)
-        value = struct.pack('>H', scaled & 0xFFFF)
+        # Encode as 2-byte unsigned integer (scaled by 100), clamped to the field range
+        scaled = min(max(int(fov * 100), 0), 0xFFFF)
+        value = _pack_uint16(scaled)
         self.items.append((self.TAG_SENSOR_H_FOV, value))
     
     def add_sensor_v_fov(self, fov: float):
@@ -204,9 +226,9 @@ class MISB0601Encoder:
         Args:
             fov: Vertical field of view in degrees (0 to 180)
         """
-        # Encode as 2-byte unsigned integer (scaled by 100)
-        scaled = int(fov * 100)
-        value = struct.pack('>H', scaled & 0xFFFF)
+        # Encode as 2-byte unsigned integer (scaled by 100), clamped to the field range
+        scaled = min(max(int(fov * 100), 0), 0xFFFF)
+        value = _pack_uint16(scaled)
         self.items.append((self.TAG_SENSOR_V_FOV, value))
     
     def add_sensor_width(self, width: float):
@@ -217,7 +239,7 @@ class MISB0601Encoder:
             width: Sensor width in millimeters
         """
         # Encode as 4-byte float
-        value = struct.pack('>f', width)
+        value = _pack_float32(width)
         self.items.append((self.TAG_SENSOR_WIDTH, value))
     
     def add_sensor_height(self, height: float):
@@ -228,7 +250,7 @@ class MISB0601Encoder:
             height: Sensor height in millimeters
         """
         # Encode as 4-byte float
-        value = struct.pack('>f', height)
+        value = _pack_float32(height)
         self.items.append((self.TAG_SENSOR_HEIGHT, value))
     
     def add_focal_length(self, focal_length: float):
@@ -239,7 +261,7 @@ class MISB0601Encoder:
             focal_length: Focal length in millimeters
         """
         # Encode as 4-byte float
-        value = struct.pack('>f', focal_length)
+        value = _pack_float32(focal_length)
         self.items.append((self.TAG_FOCAL_LENGTH, value))
     
     def add_gimbal_absolute_yaw(self, yaw: float):
@@ -251,7 +273,7 @@ class MISB0601Encoder:
         """
         # Encode as 4-byte signed integer (scaled by 1e6)
         scaled = int(yaw * 1e6)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_GIMBAL_ABS_YAW, value))
     
     def add_gimbal_absolute_pitch(self, pitch: float):
@@ -263,7 +285,7 @@ class MISB0601Encoder:
         """
         # Encode as 4-byte signed integer (scaled by 1e6)
         scaled = int(pitch * 1e6)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_GIMBAL_ABS_PITCH, value))
     
     def add_gimbal_absolute_roll(self, roll: float):
@@ -275,7 +297,7 @@ class MISB0601Encoder:
         """
         # Encode as 4-byte signed integer (scaled by 1e6)
         scaled = int(roll * 1e6)
-        value = struct.pack('>i', scaled)
+        value = _pack_int32(scaled)
         self.items.append((self.TAG_GIMBAL_ABS_ROLL, value))
     
     def _encode_ber_length(self, length: int) -> bytes:
@@ -290,16 +312,16 @@ class MISB0601Encoder:
         """
         if length < 128:
             # Short form: single byte
-            return bytes([length])
+            return length.to_bytes(1, 'big')
         elif length < 256:
             # Long form: 1 byte length
-            return bytes([0x81, length])
+            return b'\x81' + length.to_bytes(1, 'big')
         elif length < 65536:
             # Long form: 2 byte length
-            return bytes([0x82]) + struct.pack('>H', length)
+            return b'\x82' + length.to_bytes(2, 'big')
         else:
             # Long form: 4 byte length
-            return bytes([0x84]) + struct.pack('>I', length)
+            return b'\x84' + length.to_bytes(4, 'big')
     
     def pack(self) -> bytes:
         """
@@ -318,15 +340,15 @@ class MISB0601Encoder:
             lds_value.extend(value)
         
         # Build complete KLV packet: Key + Length + Value
-        klv_packet = bytearray()
-        klv_packet.extend(self.MISB_0601_KEY)
-        klv_packet.extend(self._encode_ber_length(len(lds_value)))
-        klv_packet.extend(lds_value)
-        
-        return bytes(klv_packet)
+        # (bytes.join sizes the result once and copies each part directly)
+        return b''.join((
+            self.MISB_0601_KEY,
+            self._encode_ber_length(len(lds_value)),
+            lds_value
+        ))
 
 
-def encode_telemetry_to_klv(telemetry: Dict[str, Any]) -> Optional[bytes]:
+def encode_telemetry_to_klv(telemetry: Dict[str, Any]) -> bytes:
     """
     Encode telemetry dictionary into MISB 0601 KLV packet.
     
@@ -334,102 +356,105 @@ def encode_telemetry_to_klv(telemetry: Dict[str, Any]) -> Optional[bytes]:
         telemetry: Dictionary containing telemetry data
         
     Returns:
-        KLV packet as bytes, or None if encoding fails
-    """
-    try:
-        encoder = MISB0601Encoder()
-        
-        # Add timestamp
-        if 'timestamp_us' in telemetry and telemetry['timestamp_us'] is not None:
-            encoder.add_timestamp(telemetry['timestamp_us'])
-        
-        # --- ALWAYS ADD GPS DATA (using defaults if not available) ---
-        # Add latitude (always present, uses default if GPS not fixed)
-        if 'latitude' in telemetry and telemetry['latitude'] is not None:
-            lat = float(telemetry['latitude'])
-            if -90.0 <= lat <= 90.0:
-                encoder.add_latitude(lat)
-        
-        # Add longitude (always present, uses default if GPS not fixed)
-        if 'longitude' in telemetry and telemetry['longitude'] is not None:
-            lon = float(telemetry['longitude'])
-            if -180.0 <= lon <= 180.0:
-                encoder.add_longitude(lon)
-        
-        # Add altitude (use 10m default if not available)
-        if 'altitude' in telemetry and telemetry['altitude'] is not None:
-            alt = float(telemetry['altitude'])
-            if 0 <= alt < 6553.5:  # Max value for 2-byte scaled by 10
-                encoder.add_altitude(alt)
-        else:
-            # Default altitude: 10 meters
-            encoder.add_altitude(10.0)
-        
-        # Add orientation data (platform attitude from AttitudeChanged is in RADIANS)
-        # Convert to degrees for KLV encoding (MISB 0601 expects degrees)
-        if 'roll' in telemetry and telemetry['roll'] is not None:
-            roll_rad = float(telemetry['roll'])
-            roll_deg = math.degrees(roll_rad)
-            if -180.0 <= roll_deg <= 180.0:
-                encoder.add_roll(roll_deg)
-        
-        if 'pitch' in telemetry and telemetry['pitch'] is not None:
-            pitch_rad = float(telemetry['pitch'])
-            pitch_deg = math.degrees(pitch_rad)
-            if -90.0 <= pitch_deg <= 90.0:
-                encoder.add_pitch(pitch_deg)
-        
-        if 'yaw' in telemetry and telemetry['yaw'] is not None:
-            yaw_rad = float(telemetry['yaw'])
-            yaw_deg = math.degrees(yaw_rad)
-            # Normalize yaw to 0-360 range if needed
-            if yaw_deg < 0:
-                yaw_deg = yaw_deg + 360.0
-            if 0 <= yaw_deg <= 360.0:
-                encoder.add_heading(yaw_deg)
-        
-        # --- NEW: ADD CAMERA SENSOR PARAMETERS (static data) ---
-        if 'camera_sensor_width' in telemetry and telemetry['camera_sensor_width'] is not None:
-            encoder.add_sensor_width(float(telemetry['camera_sensor_width']))
-        
-        if 'camera_sensor_height' in telemetry and telemetry['camera_sensor_height'] is not None:
-            encoder.add_sensor_height(float(telemetry['camera_sensor_height']))
-        
-        if 'camera_focal_length' in telemetry and telemetry['camera_focal_length'] is not None:
-            encoder.add_focal_length(float(telemetry['camera_focal_length']))
-        
-        # --- NEW: ADD GIMBAL STATE ---
-        # Send BOTH relative and absolute gimbal angles
-        
-        # MISB 0601 Tags 21-23: Sensor Relative Angles (relative to platform/drone)
-        if 'gimbal_yaw_rel' in telemetry and telemetry['gimbal_yaw_rel'] is not None:
-            encoder.add_sensor_relative_yaw(float(telemetry['gimbal_yaw_rel']))
-        
-        if 'gimbal_pitch_rel' in telemetry and telemetry['gimbal_pitch_rel'] is not None:
-            encoder.add_sensor_relative_pitch(float(telemetry['gimbal_pitch_rel']))
-        
-        if 'gimbal_roll_rel' in telemetry and telemetry['gimbal_roll_rel'] is not None:
-            encoder.add_sensor_relative_roll(float(telemetry['gimbal_roll_rel']))
-        
-        # Custom Tags 105-107: Gimbal Absolute Angles (world frame reference)
-        if 'gimbal_yaw_abs' in telemetry and telemetry['gimbal_yaw_abs'] is not None:
-            encoder.add_gimbal_absolute_yaw(float(telemetry['gimbal_yaw_abs']))
-        
-        if 'gimbal_pitch_abs' in telemetry and telemetry['gimbal_pitch_abs'] is not None:
-            encoder.add_gimbal_absolute_pitch(float(telemetry['gimbal_pitch_abs']))
-        
-        if 'gimbal_roll_abs' in telemetry and telemetry['gimbal_roll_abs'] is not None:
-            encoder.add_gimbal_absolute_roll(float(telemetry['gimbal_roll_abs']))
+        KLV packet as bytes
         
-        # Note: Gimbal offsets and camera alignment offsets are collected
-        # in telemetry dict and available for post-processing or alternative uses
-        
-        # Pack and return (even if empty - will contain just the KLV header)
-        return encoder.pack()
-        
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"KLV encoding error: {e}", exc_info=True)
-        return None
-
+    Raises:
+        ValueError, TypeError: If a telemetry value cannot be converted to a number
+        OverflowError, struct.error: If a value is out of range for its MISB 0601 field
+    """
+    lat_min, lat_max = LATITUDE_RANGE
+    lon_min, lon_max = LONGITUDE_RANGE
+    alt_min, alt_max = ALTITUDE_RANGE
+    roll_min, roll_max = ROLL_RANGE
+    pitch_min, pitch_max = PITCH_RANGE
+    heading_min, heading_max = HEADING_RANGE
+    
+    encoder = MISB0601Encoder()
+    
+    # Add timestamp
+    if 'timestamp_us' in telemetry and telemetry['timestamp_us'] is not None:
+        encoder.add_timestamp(telemetry['timestamp_us'])
+    
+    # --- ALWAYS ADD GPS DATA (using defaults if not available) ---
+    # Add latitude (always present, uses default if GPS not fixed)
+    if 'latitude' in telemetry and telemetry['latitude'] is not None:
+        lat = float(telemetry['latitude'])
+        if lat_min <= lat <= lat_max:
+            encoder.add_latitude(lat)
+    
+    # Add longitude (always present, uses default if GPS not fixed)
+    if 'longitude' in telemetry and telemetry['longitude'] is not None:
+        lon = float(telemetry['longitude'])
+        if lon_min <= lon <= lon_max:
+            encoder.add_longitude(lon)
+    
+    # Add altitude (use 10m default if not available)
+    if 'altitude' in telemetry and telemetry['altitude'] is not None:
+        alt = float(telemetry['altitude'])
+        if alt_min <= alt < alt_max:
+            encoder.add_altitude(alt)
+    else:
+        # Default altitude: 10 meters
+        encoder.add_altitude(10.0)
+    
+    # Add orientation data (platform attitude from AttitudeChanged is in RADIANS)
+    # Convert to degrees for KLV encoding (MISB 0601 expects degrees)
+    if 'roll' in telemetry and telemetry['roll'] is not None:
+        roll_rad = float(telemetry['roll'])
+        roll_deg = math.degrees(roll_rad)
+        if roll_min <= roll_deg <= roll_max:
+            encoder.add_roll(roll_deg)
+    
+    if 'pitch' in telemetry and telemetry['pitch'] is not None:
+        pitch_rad = float(telemetry['pitch'])
+        pitch_deg = math.degrees(pitch_rad)
+        if pitch_min <= pitch_deg <= pitch_max:
+            encoder.add_pitch(pitch_deg)
+    
+    if 'yaw' in telemetry and telemetry['yaw'] is not None:
+        yaw_rad = float(telemetry['yaw'])
+        yaw_deg = math.degrees(yaw_rad)
+        # Normalize yaw to 0-360 range if needed
+        if yaw_deg < 0:
+            yaw_deg = yaw_deg + 360.0
+        if heading_min <= yaw_deg <= heading_max:
+            encoder.add_heading(yaw_deg)
+    
+    # --- NEW: ADD CAMERA SENSOR PARAMETERS (static data) ---
+    if 'camera_sensor_width' in telemetry and telemetry['camera_sensor_width'] is not None:
+        encoder.add_sensor_width(float(telemetry['camera_sensor_width']))
+    
+    if 'camera_sensor_height' in telemetry and telemetry['camera_sensor_height'] is not None:
+        encoder.add_sensor_height(float(telemetry['camera_sensor_height']))
+    
+    if 'camera_focal_length' in telemetry and telemetry['camera_focal_length'] is not None:
+        encoder.add_focal_length(float(telemetry['camera_focal_length']))
+    
+    # --- NEW: ADD GIMBAL STATE ---
+    # Send BOTH relative and absolute gimbal angles
+    
+    # MISB 0601 Tags 21-23: Sensor Relative Angles (relative to platform/drone)
+    if 'gimbal_yaw_rel' in telemetry and telemetry['gimbal_yaw_rel'] is not None:
+        encoder.add_sensor_relative_yaw(float(telemetry['gimbal_yaw_rel']))
+    
+    if 'gimbal_pitch_rel' in telemetry and telemetry['gimbal_pitch_rel'] is not None:
+        encoder.add_sensor_relative_pitch(float(telemetry['gimbal_pitch_rel']))
+    
+    if 'gimbal_roll_rel' in telemetry and telemetry['gimbal_roll_rel'] is not None:
+        encoder.add_sensor_relative_roll(float(telemetry['gimbal_roll_rel']))
+    
+    # Custom Tags 105-107: Gimbal Absolute Angles (world frame reference)
+    if 'gimbal_yaw_abs' in telemetry and telemetry['gimbal_yaw_abs'] is not None:
+        encoder.add_gimbal_absolute_yaw(float(telemetry['gimbal_yaw_abs']))
+    
+    if 'gimbal_pitch_abs' in telemetry and telemetry['gimbal_pitch_abs'] is not None:
+        encoder.add_gimbal_absolute_pitch(float(telemetry['gimbal_pitch_abs']))
+    
+    if 'gimbal_roll_abs' in telemetry and telemetry['gimbal_roll_abs'] is not None:
+        encoder.add_gimbal_absolute_roll(float(telemetry['gimbal_roll_abs']))
+    
+    # Note: Gimbal offsets and camera alignment offsets are collected
+    # in telemetry dict and available for post-processing or alternative uses
+    
+    # Pack and return (even if empty - will contain just the KLV header)
+    return encoder.pack()
@@ -5,15 +5,33 @@ Manages both TelemetryForwarder and VideoForwarder threads.
 """
 
 import logging
+import math
+import os
 import time
 import signal
 import socket
+import threading
 import olympe
+from olympe.messages.common.CommonState import BatteryStateChanged
 
 from .telemetry import TelemetryForwarder
 from .video import VideoForwarder
 
 
+def install_signal_handlers(forwarder):
+    """
+    Route SIGINT and SIGTERM to a forwarder's graceful shutdown handler.
+    
+    Must be called from the main thread.
+    
+    Args:
+        forwarder: ParrotForwarder instance to notify
+    """
+    forwarder._start_signal_watcher()
+    signal.signal(signal.SIGINT, forwarder._signal_handler)
+    signal.signal(signal.SIGTERM, forwarder._signal_handler)
+
+
 class ParrotForwarder:
     """
     Main controller for Parrot Anafi telemetry and video forwarding.
@@ -22,7 +40,8 @@ class ParrotForwarder:
     
     def __init__(self, drone_ip, telemetry_fps=10, video_fps=30, 
                  srt_port=8890, klv_port_start=12345, auto_reconnect=True,
-                 health_check_interval=5, video_stats_interval=30):
+                 health_check_interval=5, video_stats_interval=30,
+                 video_cpus=None, video_rt_priority=None):
         """
         Initialize the Parrot forwarder.
         
@@ -35,6 +54,8 @@ class ParrotForwarder:
             auto_reconnect: Enable automatic reconnection on drone disconnect (default: True)
             health_check_interval: Seconds between connection health checks (default: 5)
             video_stats_interval: Seconds between video status reports (default: 30)
+            video_cpus: Optional set of CPU indices to pin GStreamer to (default: None)
+            video_rt_priority: Optional SCHED_FIFO priority (1-99) for GStreamer (default: None)
         """
         self.logger = logging.getLogger(f"{__name__}.ParrotForwarder")
         
@@ -45,7 +66,11 @@ class ParrotForwarder:
         self.drone = None
         self.telemetry_forwarder = None
         self.video_forwarder = None
-        self._shutdown_requested = False
+        self._shutdown_event = threading.Event()
+        # Set by the signal handler; _shutdown_event is set from the watcher
+        # thread, never from the handler (see _signal_handler)
+        self._signal_received = False
+        self._signal_pipe = None
         self._is_forwarding = False
         
         # Auto-reconnect settings
@@ -55,43 +80,81 @@ class ParrotForwarder:
         # Stats settings
         self.video_stats_interval = video_stats_interval
         
+        # GStreamer scheduling settings
+        self.video_cpus = video_cpus
+        self.video_rt_priority = video_rt_priority
+        
         # Find available port for KLV telemetry
         self.klv_port = self._find_free_port(klv_port_start)
-        self.logger.info(f"KLV telemetry port selected: {self.klv_port}")
-        
-        # Set up signal handlers for graceful shutdown
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
+        self.logger.info("KLV telemetry port selected: %d", self.klv_port)
     
-    def _signal_handler(self, signum, frame):
-        """Handle shutdown signals gracefully."""
-        if not self._shutdown_requested:
-            self.logger.info(f"\n⚠ Received signal {signum}, initiating graceful shutdown...")
-            self._shutdown_requested = True
-        else:
-            self.logger.warning(f"\n⚠ Force shutdown requested (signal {signum})")
-            # Force exit on second signal
-            import sys
-            sys.exit(1)
+    @property
+    def _shutdown_requested(self):
+        """Whether a graceful shutdown has been requested."""
+        return self._signal_received or self._shutdown_event.is_set()
     
-    def _is_port_free(self, port):
+    def _start_signal_watcher(self):
         """
-        Check if a UDP port is free.
+        Start the thread that turns received signals into a shutdown request.
         
-        Args:
-            port: Port number to check
+        The signal handler runs on the main thread between bytecodes, possibly
+        while that thread holds the shutdown Event's internal lock inside
+        wait(); calling set() from the handler could then deadlock. Instead the
+        handler writes to a self-pipe and this thread sets the Event.
+        """
+        if self._signal_pipe is not None:
+            return
+        
+        read_fd, write_fd = os.pipe()
+        # Never block the handler, even if signals pile up unread
+        os.set_blocking(write_fd, False)
+        self._signal_pipe = (read_fd, write_fd)
+        threading.Thread(
+            target=self._watch_signals,
+            args=(read_fd,),
+            daemon=True,
+            name="SignalWatcher"
+        ).start()
+    
+    def _watch_signals(self, read_fd):
+        """Log received signals and set the shutdown event (signal watcher thread)."""
+        signals_seen = 0
+        while True:
+            try:
+                data = os.read(read_fd, 1)
+            except OSError:
+                return
+            if not data:
+                return
             
-        Returns:
-            bool: True if port is free, False otherwise
+            signals_seen += 1
+            if signals_seen == 1:
+                self.logger.info(f"\n⚠ Received signal {data[0]}, initiating graceful shutdown...")
+                self._shutdown_event.set()
+            else:
+                self.logger.warning(f"\n⚠ Force shutdown requested (signal {data[0]})")
+    
+    def _signal_handler(self, signum, frame):
         """
-        try:
-            # Try to bind to the port
-            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock.bind(('127.0.0.1', port))
-            sock.close()
-            return True
-        except OSError:
-            return False
+        Handle shutdown signals gracefully.
+        
+        Only sets a plain flag and wakes the signal watcher thread, which does
+        the logging and sets the shutdown Event; taking any lock here could
+        hang on Ctrl+C. A second signal forces exit.
+        """
+        first_signal = not self._signal_received
+        self._signal_received = True
+        
+        if self._signal_pipe is not None:
+            try:
+                os.write(self._signal_pipe[1], bytes((signum & 0xFF,)))
+            except OSError:
+                pass
+        
+        if not first_signal:
+            # Force exit on second signal
+            import sys
+            sys.exit(1)
     
     def _find_free_port(self, start_port, max_attempts=100):
         """
@@ -107,12 +170,23 @@ class ParrotForwarder:
         Raises:
             RuntimeError: If no free port found within max_attempts
         """
-        for offset in range(max_attempts):
-            port = start_port + offset
-            if self._is_port_free(port):
+        # Probe with a single socket: a failed bind leaves it unbound, so the
+        # same descriptor can be retried on the next port
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # Make sure ports held by other sockets are reported as in use
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 0)
+            for offset in range(max_attempts):
+                port = start_port + offset
+                try:
+                    sock.bind(('127.0.0.1', port))
+                except OSError:
+                    continue
                 if offset > 0:
                     self.logger.info(f"Port {start_port} was in use, using port {port} instead")
                 return port
+        finally:
+            sock.close()
         
         raise RuntimeError(f"Could not find free port starting from {start_port} after {max_attempts} attempts")
         
@@ -150,14 +224,12 @@ class ParrotForwarder:
             except Exception as e:
                 self.logger.error(f"✗ Connection attempt {attempt} error: {e}")
             
-            # Wait before retry (with KeyboardInterrupt handling)
+            # Wait before retry; a shutdown signal aborts the wait immediately
             if max_retries is None or attempt < max_retries:
-                try:
-                    self.logger.info(f"Retrying in {retry_interval} seconds... (Ctrl+C to cancel)")
-                    time.sleep(retry_interval)
-                except KeyboardInterrupt:
+                self.logger.info(f"Retrying in {retry_interval} seconds... (Ctrl+C to cancel)")
+                if self._shutdown_event.wait(retry_interval):
                     self.logger.info("\n⚠ Retry interrupted by user")
-                    raise
+                    raise KeyboardInterrupt
     
     def _wait_for_drone_ready(self, timeout=30):
         """
@@ -168,22 +240,19 @@ class ParrotForwarder:
         """
         self.logger.info("Waiting for drone telemetry to initialize...")
         
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                # Try to get basic telemetry to verify drone is ready
-                from olympe.messages.common.CommonState import BatteryStateChanged
-                battery = self.drone.get_state(BatteryStateChanged)
-                
-                if battery is not None:
-                    self.logger.info("✓ Drone telemetry is ready")
-                    return
-                    
-            except Exception as e:
-                # Telemetry not ready yet, continue waiting
-                pass
+        try:
+            # Block on an Olympe expectation for the first battery state instead
+            # of polling; "check_wait" returns immediately if it already arrived
+            expectation = self.drone(
+                BatteryStateChanged(_policy="check_wait", _timeout=timeout)
+            ).wait()
             
-            time.sleep(0.5)
+            if expectation.success():
+                self.logger.info("✓ Drone telemetry is ready")
+                return
+                
+        except Exception as e:
+            self.logger.debug("Error waiting for drone telemetry: %s", e)
         
         self.logger.warning("⚠ Drone telemetry initialization timeout - proceeding anyway")
     
@@ -204,14 +273,13 @@ class ParrotForwarder:
                 return False
             
             # Try to get telemetry to verify the connection is alive
-            from olympe.messages.common.CommonState import BatteryStateChanged
             battery = self.drone.get_state(BatteryStateChanged)
             
             # If we can get state, connection is alive
             return battery is not None
             
         except Exception as e:
-            self.logger.debug(f"Connection check failed: {e}")
+            self.logger.debug("Connection check failed: %s", e)
             return False
         
     def start_forwarding(self):
@@ -220,20 +288,25 @@ class ParrotForwarder:
             self.logger.warning("Forwarders already running, skipping start")
             return
         
-        self.logger.info("=" * 60)
-        self.logger.info("Starting Parrot Forwarder")
-        self.logger.info(f"  Drone IP: {self.drone_ip}")
-        self.logger.info(f"  Telemetry FPS: {self.telemetry_fps}")
-        self.logger.info(f"  Telemetry Format: KLV (MISB 0601) -> localhost:{self.klv_port}")
-        self.logger.info(f"  Video FPS: {self.video_fps} (streaming at original drone framerate)")
-        self.logger.info(f"  Output: Unified SRT stream (video + KLV) on port {self.srt_port}")
-        self.logger.info(f"  Client command: ffplay 'srt://<your-ip>:{self.srt_port}'")
-        self.logger.info(f"  NOTE: Using GStreamer for native KLV muxing")
-        if self.auto_reconnect:
-            self.logger.info(f"  Auto-reconnect: ENABLED (health check every {self.health_check_interval}s)")
-        else:
-            self.logger.info(f"  Auto-reconnect: DISABLED")
-        self.logger.info("=" * 60)
+        # Emit the banner as one record instead of a dozen separate log calls
+        if self.logger.isEnabledFor(logging.INFO):
+            if self.auto_reconnect:
+                reconnect_line = f"  Auto-reconnect: ENABLED (health check every {self.health_check_interval}s)"
+            else:
+                reconnect_line = "  Auto-reconnect: DISABLED"
+            self.logger.info("\n".join((
+                "=" * 60,
+                "Starting Parrot Forwarder",
+                f"  Drone IP: {self.drone_ip}",
+                f"  Telemetry FPS: {self.telemetry_fps}",
+                f"  Telemetry Format: KLV (MISB 0601) -> localhost:{self.klv_port}",
+                f"  Video FPS: {self.video_fps} (streaming at original drone framerate)",
+                f"  Output: Unified SRT stream (video + KLV) on port {self.srt_port}",
+                f"  Client command: ffplay 'srt://<your-ip>:{self.srt_port}'",
+                "  NOTE: Using GStreamer for native KLV muxing",
+                reconnect_line,
+                "=" * 60,
+            )))
         
         # Create forwarders
         self.telemetry_forwarder = TelemetryForwarder(
@@ -246,22 +319,29 @@ class ParrotForwarder:
             self.srt_port,
             self.klv_port,
             self.video_stats_interval,
-            use_high_latency=True
+            use_high_latency=True,
+            cpu_affinity=self.video_cpus,
+            rt_priority=self.video_rt_priority
         )
         
-        # Wait for video stream to initialize
-        self.logger.info("Waiting for video stream to initialize...")
-        time.sleep(1)
-        
         # Start forwarder threads
         self.telemetry_forwarder.start()
         self.video_forwarder.start()
-        
-        self.logger.info("✓ Both forwarders started")
         self._is_forwarding = True
         
-        # Give forwarders a moment to initialize
-        time.sleep(1)
+        # Wait for both forwarders to report ready (shared 2s budget)
+        self.logger.info("Waiting for forwarders to initialize...")
+        ready_deadline = time.monotonic() + 2.0
+        telemetry_ready = self.telemetry_forwarder.ready.wait(max(0.0, ready_deadline - time.monotonic()))
+        video_ready = self.video_forwarder.ready.wait(max(0.0, ready_deadline - time.monotonic()))
+        
+        if telemetry_ready and video_ready:
+            self.logger.info("✓ Both forwarders started")
+        else:
+            if not telemetry_ready:
+                self.logger.warning("⚠ Telemetry forwarder not ready yet - proceeding anyway")
+            if not video_ready:
+                self.logger.warning("⚠ Video forwarder not ready yet - proceeding anyway")
         
     def stop_forwarding(self):
         """Stop both telemetry and video forwarding."""
@@ -281,14 +361,18 @@ class ParrotForwarder:
         if self.video_forwarder:
             self.video_forwarder.stop()
         
-        # Wait for threads to finish with shorter timeout
+        # Wait for threads to finish. Both were signalled above and shut down
+        # concurrently, so the join timeouts share one start time and the
+        # total wait is the longest timeout rather than their sum.
+        join_start = time.monotonic()
         if self.telemetry_forwarder and self.telemetry_forwarder.is_alive():
             self.telemetry_forwarder.join(timeout=1)
             if self.telemetry_forwarder.is_alive():
                 self.logger.warning("Telemetry forwarder thread did not stop cleanly")
         
         if self.video_forwarder and self.video_forwarder.is_alive():
-            self.video_forwarder.join(timeout=3)  # Give video forwarder more time for FFmpeg cleanup
+            # Give video forwarder more time for GStreamer cleanup
+            self.video_forwarder.join(timeout=max(0.0, join_start + 3 - time.monotonic()))
             if self.video_forwarder.is_alive():
                 self.logger.warning("Video forwarder thread did not stop cleanly")
         
@@ -317,9 +401,15 @@ class ParrotForwarder:
             max_retries: Maximum connection retry attempts for initial connection (None = infinite)
             retry_interval: Seconds between connection retries
         """
-        start_time = time.time()
+        # Set up signal handlers for graceful shutdown
+        install_signal_handlers(self)
+        
+        # Deadlines use the monotonic clock so wall-clock adjustments during a
+        # long session cannot fire the duration or health checks early or late
+        start_time = time.monotonic()
+        duration_deadline = start_time + duration if duration else math.inf
+        next_health_check = start_time + self.health_check_interval if self.auto_reconnect else math.inf
         connection_attempts = 0
-        last_health_check = 0
         
         try:
             # Initial connection
@@ -334,16 +424,16 @@ class ParrotForwarder:
                 self.logger.info("Running indefinitely (Ctrl+C to stop)...")
             
             while not self._shutdown_requested:
-                current_time = time.time()
+                now = time.monotonic()
                 
                 # Check if duration expired
-                if duration and (current_time - start_time) >= duration:
+                if now >= duration_deadline:
                     self.logger.info("Duration expired, shutting down...")
                     break
                 
                 # Perform health check at intervals
-                if self.auto_reconnect and (current_time - last_health_check) >= self.health_check_interval:
-                    last_health_check = current_time
+                if now >= next_health_check:
+                    next_health_check = now + self.health_check_interval
                     
                     if not self.is_drone_connected():
                         self.logger.warning("⚠ Drone connection lost! Attempting to reconnect...")
@@ -353,13 +443,16 @@ class ParrotForwarder:
                         self.stop_forwarding()
                         self.disconnect()
                         
-                        # Wait a moment before reconnecting
-                        time.sleep(2)
+                        # Back off before reconnecting: 2s, doubling per consecutive
+                        # failed attempt, capped at 30s
+                        backoff = min(2 * 2 ** min(connection_attempts - 1, 4), 30)
+                        if self._shutdown_event.wait(backoff):
+                            break
                         
-                        # Attempt reconnection
+                        # Attempt reconnection once; the health check loop retries
                         try:
                             self.logger.info(f"Reconnection attempt #{connection_attempts}...")
-                            self.connect(max_retries=3, retry_interval=retry_interval)
+                            self.connect(max_retries=1, retry_interval=retry_interval)
                             self.start_forwarding()
                             
                             self.logger.info(f"✓ Successfully reconnected to drone (attempt #{connection_attempts})")
@@ -369,12 +462,15 @@ class ParrotForwarder:
                             raise
                         except Exception as e:
                             self.logger.error(f"Reconnection attempt #{connection_attempts} failed: {e}")
-                            self.logger.info(f"Will retry in {retry_interval} seconds...")
-                            time.sleep(retry_interval)
-                            continue
+                            self.logger.info("Will retry at the next health check")
                 
-                # Sleep for a short interval
-                time.sleep(1)
+                # Wait until the next health check or the duration deadline;
+                # a shutdown signal wakes the wait immediately
+                next_deadline = min(duration_deadline, next_health_check)
+                if next_deadline == math.inf:
+                    self._shutdown_event.wait()
+                else:
+                    self._shutdown_event.wait(max(0.0, next_deadline - time.monotonic()))
             
         except KeyboardInterrupt:
             self.logger.info("\n⚠ Shutting down gracefully...")
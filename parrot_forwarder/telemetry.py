@@ -7,10 +7,9 @@ Reads drone telemetry at specified FPS and forwards via KLV (MISB 0601) over UDP
 import logging
 import time
 import threading
-import json
 import socket
 import math
-from datetime import datetime
+from collections import deque
 
 from .klv_encoder import encode_telemetry_to_klv
 
@@ -25,10 +24,6 @@ from olympe.messages.common.CommonState import BatteryStateChanged
 from olympe.messages.gimbal import attitude as GimbalAttitude, offsets as GimbalOffsets
 from olympe.messages.camera import alignment_offsets
 
-# --- NEW IMPORTS (heading) ---
-from olympe.messages.ardrone3.PilotingState import AttitudeChanged
-
-
 
 class TelemetryForwarder(threading.Thread):
     """
@@ -52,6 +47,8 @@ class TelemetryForwarder(threading.Thread):
         self.fps = fps
         self.interval = 1.0 / fps
         self.running = False
+        self._stop_event = threading.Event()
+        self.ready = threading.Event()
         self.telemetry_count = 0
         self.logger = logging.getLogger(f"{__name__}.{name}")
         
@@ -61,6 +58,16 @@ class TelemetryForwarder(threading.Thread):
         self.SENSOR_HEIGHT_MM = 4.7
         self.FOCAL_LENGTH_EQ_MM = 23.0  # 35mm equivalent at 1x zoom
         
+        # Per-sample template holding the static fields; each frame starts from
+        # a fresh copy, so no stale keys from an earlier sample leak into it
+        self._telemetry_template = {
+            'timestamp_us': None,
+            'sequence': None,
+            'camera_sensor_width': self.SENSOR_WIDTH_MM,
+            'camera_sensor_height': self.SENSOR_HEIGHT_MM,
+            'camera_focal_length': self.FOCAL_LENGTH_EQ_MM,
+        }
+        
         # KLV forwarding configuration - always send to localhost for FFmpeg
         self.local_klv_host = '127.0.0.1'
         self.local_klv_port = klv_port
@@ -69,7 +76,12 @@ class TelemetryForwarder(threading.Thread):
         # Initialize UDP socket for KLV forwarding (raw KLV for GStreamer)
         try:
             self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.udp_socket.setblocking(True)
+            # Non-blocking: a full send buffer drops the packet instead of
+            # stalling the acquisition loop and skewing the frame cadence
+            self.udp_socket.setblocking(False)
+            self._tune_socket(self.udp_socket)
+            # Connect once so each send skips address marshalling and route lookup
+            self.udp_socket.connect((self.local_klv_host, self.local_klv_port))
             self.logger.info(f"✓ KLV UDP socket initialized - sending to {self.local_klv_host}:{self.local_klv_port}")
         except Exception as e:
             self.logger.error(f"✗ Failed to create KLV UDP socket: {e}")
@@ -79,11 +91,64 @@ class TelemetryForwarder(threading.Thread):
         self.start_time = None
         self.last_stats_time = None
         self.stats_interval = 5.0  # Report stats every 5 seconds
-        self.loop_times = []
-        self.max_loop_times = 100  # Keep last 100 loop times for stats
+        self.max_loop_times = 100  # Keep last 100 loop times (ns) for stats
+        self.loop_times = deque(maxlen=self.max_loop_times)
+        # Thread CPU vs wall time spent in loop work since the last stats report;
+        # their gap is time the thread was runnable but blocked (GIL, olympe locks)
+        self.loop_cpu_ns = 0
+        self.loop_wall_ns = 0
         self.packets_sent = 0
         self.send_errors = 0
+        self.packets_coalesced = 0
+        self.packets_dropped = 0
+        
+        # Unchanged telemetry is not re-sent, but is refreshed at least once
+        # per second: at most fps - 1 frames are skipped between sends
+        # (set to 0 to send every frame)
+        self.max_coalesce_frames = fps - 1
+        self.logged_error_types = set()
+        # Refused sends mean GStreamer's KLV listener is down; warn at most
+        # once per interval so it stays visible without flooding the log
+        self.refused_warning_interval = 10.0
+        self.last_refused_warning = None
+        
+    def _tune_socket(self, sock):
+        """
+        Enlarge the send buffer and mark KLV traffic as low-latency.
+        
+        Every option is best-effort: unsupported options (non-Linux) or
+        limits imposed by the kernel are logged and otherwise ignored.
+        
+        Args:
+            sock: UDP socket used for KLV forwarding
+        """
+        # Absorb short bursts instead of dropping packets with BlockingIOError
+        # (the kernel caps the request at net.core.wmem_max)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 << 20)
+        except OSError as e:
+            self.logger.debug("Could not set SO_SNDBUF: %s", e)
+        
+        # IPTOS_LOWDELAY for queueing disciplines that classify on TOS
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, 0x10)
+        except (OSError, AttributeError) as e:
+            self.logger.debug("Could not set IP_TOS: %s", e)
         
+        # Linux-only: higher priority band for locally queued packets
+        so_priority = getattr(socket, 'SO_PRIORITY', None)
+        if so_priority is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, so_priority, 6)
+            except OSError as e:
+                self.logger.debug("Could not set SO_PRIORITY: %s", e)
+        
+        try:
+            sndbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+            self.logger.info(f"KLV UDP send buffer: {sndbuf // 1024} KiB")
+        except OSError:
+            pass
+    
     def get_telemetry_data(self):
         """
         Collect current telemetry data from the drone.
@@ -91,29 +156,26 @@ class TelemetryForwarder(threading.Thread):
         Returns:
             dict: Dictionary containing all telemetry data
         """
-        telemetry = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'sequence': self.telemetry_count,
-        }
+        telemetry = self._telemetry_template.copy()
+        telemetry['timestamp_us'] = time.time_ns() // 1000  # Unix time in microseconds
+        telemetry['sequence'] = self.telemetry_count
         
         try:
+            # Olympe has no public bulk state accessor; bind the lookup once
+            get_state = self.drone.get_state
+            
             # Battery
-            battery = self.drone.get_state(BatteryStateChanged)
+            battery = get_state(BatteryStateChanged)
             if battery:
                 telemetry['battery_percent'] = battery.get('percent', None)
             
             # GPS
-            gps_fix = self.drone.get_state(GPSFixStateChanged)
+            gps_fix = get_state(GPSFixStateChanged)
             if gps_fix:
                 telemetry['gps_fixed'] = bool(gps_fix.get('fixed', 0))
-
-            # Camera details
-            telemetry['camera_sensor_width'] = self.SENSOR_WIDTH_MM
-            telemetry['camera_sensor_height'] = self.SENSOR_HEIGHT_MM
-            telemetry['camera_focal_length'] = self.FOCAL_LENGTH_EQ_MM
             
             # Position
-            position = self.drone.get_state(PositionChanged)
+            position = get_state(PositionChanged)
             if position:
                 # Get position values (may be 500.0 if GPS not available - Parrot's invalid GPS marker)
                 lat = position.get('latitude', 500.0)
@@ -132,33 +194,33 @@ class TelemetryForwarder(threading.Thread):
                 telemetry['altitude'] = 10.0  # Default altitude: 10 meters
             
             # Altitude
-            altitude = self.drone.get_state(AltitudeChanged)
+            altitude = get_state(AltitudeChanged)
             if altitude:
                 telemetry['altitude_agl'] = altitude.get('altitude', None)
             
             # Attitude (orientation) - NOTE: roll/pitch/yaw are in RADIANS (sent as-is)
             # Conversion to degrees will be done on the receiver side
-            attitude = self.drone.get_state(AttitudeChanged)
+            attitude = get_state(AttitudeChanged)
             if attitude:
                 telemetry['roll'] = attitude.get('roll', None)
                 telemetry['pitch'] = attitude.get('pitch', None)
                 telemetry['yaw'] = attitude.get('yaw', None)
             
             # Speed
-            speed = self.drone.get_state(SpeedChanged)
+            speed = get_state(SpeedChanged)
             if speed:
                 telemetry['speed_x'] = speed.get('speedX', None)
                 telemetry['speed_y'] = speed.get('speedY', None)
                 telemetry['speed_z'] = speed.get('speedZ', None)
             
             # Flying state
-            flying_state = self.drone.get_state(FlyingStateChanged)
+            flying_state = get_state(FlyingStateChanged)
             if flying_state:
                 telemetry['flying_state'] = flying_state.get('state', None)
             
             # --- NEW: GIMBAL STATE ---
             # Gimbal angles are already in DEGREES according to Olympe documentation
-            gatt = self.drone.get_state(GimbalAttitude)
+            gatt = get_state(GimbalAttitude)
             if gatt:
                 # Absolute gimbal orientation (yaw/pitch/roll) - already in degrees
                 # Defines camera pointing direction in world frame
@@ -172,7 +234,7 @@ class TelemetryForwarder(threading.Thread):
                 telemetry['gimbal_pitch_rel'] = gatt.get('pitch_relative', None)
                 telemetry['gimbal_roll_rel'] = gatt.get('roll_relative', None)
 
-            goff = self.drone.get_state(GimbalOffsets)
+            goff = get_state(GimbalOffsets)
             if goff:
                 # Real-time gimbal correction offsets (yaw/pitch/roll) - already in degrees
                 # Apply these to refine the camera orientation
@@ -182,7 +244,7 @@ class TelemetryForwarder(threading.Thread):
 
             # --- NEW: CAMERA ALIGNMENT OFFSETS ---
             # Camera alignment offsets are already in DEGREES according to Olympe documentation
-            cam_align = self.drone.get_state(alignment_offsets)
+            cam_align = get_state(alignment_offsets)
             if cam_align:
                 # Fixed misalignment between camera and gimbal/drone - already in degrees
                 # Include these for accurate orientation chaining
@@ -199,66 +261,97 @@ class TelemetryForwarder(threading.Thread):
         
         return telemetry
     
+    @staticmethod
+    def _telemetry_state(telemetry):
+        """
+        Get the part of a telemetry sample that reflects drone state.
+        
+        Args:
+            telemetry: Dictionary containing telemetry data
+            
+        Returns:
+            tuple: Telemetry items excluding per-frame timestamp and sequence
+        """
+        return tuple(
+            item for item in telemetry.items()
+            if item[0] not in ('timestamp_us', 'sequence')
+        )
+    
     def forward_telemetry(self, telemetry):
         """
         Forward telemetry data via UDP as KLV (MISB 0601) binary format.
         
         Args:
             telemetry: Dictionary containing telemetry data
+            
+        Returns:
+            bool: True if the packet was handed to the socket, False if it was
+            dropped or failed (the caller then retries on the next frame)
         """
         if not self.udp_socket:
-            return
+            return False
         
         try:
-            # Convert ISO timestamp to Unix timestamp in microseconds
-            try:
-                ts_str = telemetry.get('timestamp', datetime.utcnow().isoformat())
-                # Handle both with and without 'Z' suffix
-                ts_str = ts_str.replace('Z', '+00:00')
-                dt = datetime.fromisoformat(ts_str)
-                telemetry['timestamp_us'] = int(dt.timestamp() * 1_000_000)
-            except Exception as e:
-                self.logger.warning(f"Error parsing timestamp: {e}")
-                telemetry['timestamp_us'] = None
-            
             # Encode telemetry to KLV using our custom encoder
             klv_packet = encode_telemetry_to_klv(telemetry)
             
-            if not klv_packet:
-                self.send_errors += 1
-                self.logger.error(f"✗ Failed to encode KLV packet. Telemetry: {telemetry}")
-                return
-            
-            # Debug: log first few KLV packets
-            if self.packets_sent < 2:
-                gps_status = "GPS FIXED" if telemetry.get('gps_fixed') else "NO GPS (orientation only)"
-                self.logger.info(
-                    f"DEBUG: KLV packet #{self.packets_sent + 1} - "
-                    f"{len(klv_packet)} bytes - {gps_status}"
+            # Debug: log first few KLV packets (skipped entirely unless DEBUG is enabled)
+            if self.packets_sent < 2 and self.logger.isEnabledFor(logging.DEBUG):
+                get = telemetry.get
+                self.logger.debug(
+                    "KLV packet #%d - %d bytes - %s",
+                    self.packets_sent + 1, len(klv_packet),
+                    "GPS FIXED" if get('gps_fixed') else "NO GPS (orientation only)"
                 )
-                if telemetry.get('gps_fixed'):
-                    self.logger.info(
-                        f"  GPS: Lat={telemetry.get('latitude', 'N/A')}, "
-                        f"Lon={telemetry.get('longitude', 'N/A')}, "
-                        f"Alt={telemetry.get('altitude', 'N/A')}m"
+                if get('gps_fixed'):
+                    self.logger.debug(
+                        "  GPS: Lat=%s, Lon=%s, Alt=%sm",
+                        get('latitude', 'N/A'), get('longitude', 'N/A'), get('altitude', 'N/A')
                     )
-                self.logger.info(
-                    f"  Orientation: Roll={telemetry.get('roll', 'N/A'):.3f}°, "
-                    f"Pitch={telemetry.get('pitch', 'N/A'):.3f}°, "
-                    f"Yaw={telemetry.get('yaw', 'N/A'):.3f}°"
+                self.logger.debug(
+                    "  Orientation: Roll=%s rad, Pitch=%s rad, Yaw=%s rad",
+                    get('roll', 'N/A'), get('pitch', 'N/A'), get('yaw', 'N/A')
                 )
             
             # Send raw KLV packet via UDP to localhost for GStreamer
-            self.udp_socket.sendto(klv_packet, (self.local_klv_host, self.local_klv_port))
+            self.udp_socket.send(klv_packet)
             self.packets_sent += 1
             
             # Debug: log first few KLV packets
             if self.packets_sent <= 3:
-                self.logger.info(f"Sent KLV packet #{self.packets_sent}: {len(klv_packet)} bytes")
+                self.logger.info("Sent KLV packet #%d: %d bytes", self.packets_sent, len(klv_packet))
             
+            return True
+            
+        except BlockingIOError:
+            # Send buffer full; the packet is dropped and the caller resends
+            # on the next frame even if the telemetry has not changed
+            self.packets_dropped += 1
+        except ConnectionRefusedError:
+            # A connected UDP socket reports ICMP port-unreachable from an earlier
+            # send; GStreamer is not listening yet (or is restarting)
+            self.send_errors += 1
+            now = time.monotonic()
+            if (self.last_refused_warning is None
+                    or now - self.last_refused_warning >= self.refused_warning_interval):
+                self.last_refused_warning = now
+                self.logger.warning(
+                    "⚠ KLV consumer not listening on port %d - telemetry is not reaching "
+                    "the stream (is GStreamer running?)", self.local_klv_port
+                )
+            else:
+                self.logger.debug("KLV consumer not listening on port %d", self.local_klv_port)
         except Exception as e:
             self.send_errors += 1
-            self.logger.error(f"✗ Error encoding or sending KLV packet #{self.packets_sent}: {e}")
+            # Log each error type once at ERROR to avoid flooding the log at telemetry rate
+            error_type = type(e).__name__
+            if error_type not in self.logged_error_types:
+                self.logged_error_types.add(error_type)
+                self.logger.error(f"✗ Error encoding or sending KLV packet #{self.packets_sent}: {e}")
+            else:
+                self.logger.debug("Error encoding or sending KLV packet #%d: %s", self.packets_sent, e)
+        
+        return False
     
     def log_performance_stats(self):
         """Log performance statistics."""
@@ -280,6 +373,14 @@ class TelemetryForwarder(threading.Thread):
                 min_loop_time = min(self.loop_times)
                 max_loop_time = max(self.loop_times)
                 
+                # Blocking ratio (β): fraction of loop wall time not spent on CPU
+                if self.loop_wall_ns > 0:
+                    blocked_ratio = max(0.0, 1.0 - self.loop_cpu_ns / self.loop_wall_ns)
+                else:
+                    blocked_ratio = 0.0
+                self.loop_cpu_ns = 0
+                self.loop_wall_ns = 0
+                
                 # Check if we're meeting target FPS
                 fps_ratio = (actual_fps / self.fps) * 100 if self.fps > 0 else 0
                 
@@ -289,9 +390,11 @@ class TelemetryForwarder(threading.Thread):
                 perf_msg = (
                     f"{status} PERFORMANCE: "
                     f"Target={self.fps:.1f} fps, Actual={actual_fps:.2f} fps ({fps_ratio:.1f}%) | "
-                    f"Loop: avg={avg_loop_time*1000:.2f}ms, min={min_loop_time*1000:.2f}ms, max={max_loop_time*1000:.2f}ms | "
+                    f"Loop: avg={avg_loop_time/1e6:.2f}ms, min={min_loop_time/1e6:.2f}ms, max={max_loop_time/1e6:.2f}ms, "
+                    f"blocked(β)={blocked_ratio:.2f} | "
                     f"Count={self.telemetry_count} | "
-                    f"KLV: sent={self.packets_sent}, errors={self.send_errors}"
+                    f"KLV: sent={self.packets_sent}, coalesced={self.packets_coalesced}, "
+                    f"dropped={self.packets_dropped}, errors={self.send_errors}"
                 )
                 
                 self.logger.info(perf_msg)
@@ -302,6 +405,11 @@ class TelemetryForwarder(threading.Thread):
                         f"Telemetry forwarding is running at {fps_ratio:.1f}% of target FPS! "
                         f"Target: {self.fps} fps, Actual: {actual_fps:.2f} fps"
                     )
+                    if blocked_ratio > 0.3:
+                        self.logger.warning(
+                            f"Telemetry loop spent {blocked_ratio*100:.0f}% of its time blocked "
+                            f"rather than on CPU (GIL or drone state contention)"
+                        )
             
             self.last_stats_time = current_time
     
@@ -311,51 +419,76 @@ class TelemetryForwarder(threading.Thread):
         self.running = True
         self.start_time = time.time()
         self.last_stats_time = self.start_time
+        self.ready.set()
         
-        # Use target time instead of sleep-based timing for better precision
-        next_frame_time = self.start_time
+        # Schedule frames on integer nanoseconds of the monotonic clock: immune
+        # to wall-clock steps and free of float rounding across long sessions
+        now_ns = time.monotonic_ns
+        thread_time_ns = time.thread_time_ns
+        interval_ns = int(1e9 / self.fps)
+        next_frame_ns = now_ns()
         
+        # Bind per-frame lookups to locals once; the loop runs at FPS Hz
+        # Pace on the stop event so stop() wakes the loop instead of waiting out a frame
+        wait = self._stop_event.wait
+        get_telemetry_data = self.get_telemetry_data
+        forward_telemetry = self.forward_telemetry
+        log_performance_stats = self.log_performance_stats
+        telemetry_state = self._telemetry_state
+        max_coalesce_frames = self.max_coalesce_frames
+        last_state = None
+        frames_coalesced = 0
+        record_loop_time = self.loop_times.append
         while self.running:
             try:
-                loop_start = time.time()
+                loop_start = now_ns()
+                cpu_start = thread_time_ns()
                 
                 # Get telemetry data
-                telemetry = self.get_telemetry_data()
+                telemetry = get_telemetry_data()
                 self.telemetry_count += 1
                 
-                # Forward telemetry
-                self.forward_telemetry(telemetry)
+                # Forward telemetry, skipping samples where only the timestamp changed
+                state = telemetry_state(telemetry)
+                if state == last_state and frames_coalesced < max_coalesce_frames:
+                    frames_coalesced += 1
+                    self.packets_coalesced += 1
+                elif forward_telemetry(telemetry):
+                    # Only a delivered packet counts as the receiver's latest
+                    # state; after a failed send the next frame retries
+                    last_state = state
+                    frames_coalesced = 0
                 
                 # Track loop time
-                loop_time = time.time() - loop_start
-                self.loop_times.append(loop_time)
-                if len(self.loop_times) > self.max_loop_times:
-                    self.loop_times.pop(0)
+                loop_time_ns = now_ns() - loop_start
+                self.loop_cpu_ns += thread_time_ns() - cpu_start
+                self.loop_wall_ns += loop_time_ns
+                record_loop_time(loop_time_ns)
                 
                 # Log performance stats periodically
-                self.log_performance_stats()
+                log_performance_stats()
                 
                 # Calculate next target time
-                next_frame_time += self.interval
-                current_time = time.time()
-                sleep_time = next_frame_time - current_time
+                next_frame_ns += interval_ns
+                sleep_ns = next_frame_ns - now_ns()
                 
-                if sleep_time > 0:
-                    # Sleep until next frame time
-                    time.sleep(sleep_time)
+                if sleep_ns > 0:
+                    # Sleep until next frame time (or until stop() is called)
+                    if wait(sleep_ns / 1e9):
+                        break
                 else:
                     # We're falling behind - reset timing to avoid spiral
-                    if sleep_time < -self.interval:
+                    if sleep_ns < -interval_ns:
                         self.logger.warning(
-                            f"Fell behind by {-sleep_time*1000:.2f}ms - resetting timing"
+                            f"Fell behind by {-sleep_ns/1e6:.2f}ms - resetting timing"
                         )
-                        next_frame_time = time.time()
+                        next_frame_ns = now_ns()
                     
                     # Warn if we can't keep up
                     if self.telemetry_count % self.fps == 0:  # Once per second
                         self.logger.warning(
-                            f"Cannot maintain {self.fps} fps - loop took {loop_time*1000:.2f}ms "
-                            f"(target: {self.interval*1000:.2f}ms)"
+                            f"Cannot maintain {self.fps} fps - loop took {loop_time_ns/1e6:.2f}ms "
+                            f"(target: {interval_ns/1e6:.2f}ms)"
                         )
                 
             except KeyboardInterrupt:
@@ -364,25 +497,36 @@ class TelemetryForwarder(threading.Thread):
                 break
             except Exception as e:
                 self.logger.error(f"Error in telemetry loop: {e}")
-                next_frame_time = time.time() + self.interval
-                time.sleep(self.interval)
+                next_frame_ns = now_ns() + interval_ns
+                if wait(self.interval):
+                    break
         
         # Final stats
         if self.start_time:
             total_elapsed = time.time() - self.start_time
             final_fps = self.telemetry_count / total_elapsed if total_elapsed > 0 else 0
             self.logger.info(
-                f"Stopped - Forwarded {self.telemetry_count} telemetry packets | "
+                f"Stopped - Collected {self.telemetry_count} telemetry samples "
+                f"({self.packets_sent} KLV packets sent, {self.packets_coalesced} unchanged skipped) | "
                 f"Average FPS: {final_fps:.2f} (target: {self.fps})"
             )
+        
+        # Closed here rather than in stop() so an in-flight send never hits a closed socket
+        self._close_socket()
     
-    def stop(self):
-        """Stop the telemetry forwarder and cleanup resources."""
-        self.running = False
+    def _close_socket(self):
+        """Close the KLV UDP socket, ignoring errors."""
         if self.udp_socket:
             try:
                 self.udp_socket.close()
             except:
                 pass
+    
+    def stop(self):
+        """Stop the telemetry forwarder and cleanup resources."""
+        self.running = False
+        self._stop_event.set()
+        # A running loop closes the socket itself on exit
+        if not self.is_alive():
+            self._close_socket()
         self.logger.info("Stopped")
-
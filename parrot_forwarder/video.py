@@ -3,6 +3,8 @@
 VideoForwarder using GStreamer - Mux video and KLV data streams
 """
 
+import os
+import select
 import subprocess
 import signal
 import logging
@@ -20,7 +22,8 @@ class VideoForwarder(threading.Thread):
     Uses GStreamer's mpegtsmux for proper data stream support.
     """
     
-    def __init__(self, drone_ip, srt_port=8890, klv_port=12345, stats_interval=30, use_high_latency=True):
+    def __init__(self, drone_ip, srt_port=8890, klv_port=12345, stats_interval=30, use_high_latency=True,
+                 cpu_affinity=None, rt_priority=None):
         """
         Initialize the video forwarder.
         
@@ -31,6 +34,10 @@ class VideoForwarder(threading.Thread):
             stats_interval: Seconds between status reports (default: 30)
             use_high_latency: Use high-latency pipeline for poor networks (default: True)
                             Set to False for low-latency on good networks
+            cpu_affinity: Optional set of CPU indices to pin GStreamer to
+                          (Linux, uses taskset)
+            rt_priority: Optional SCHED_FIFO priority (1-99) for GStreamer (Linux, uses
+                         chrt; needs CAP_SYS_NICE or an rtprio ulimit)
         """
         super().__init__(daemon=True)
         self.drone_ip = drone_ip
@@ -38,8 +45,11 @@ class VideoForwarder(threading.Thread):
         self.klv_port = klv_port
         self.srt_url = f"srt://0.0.0.0:{srt_port}?mode=listener"
         self.use_high_latency = use_high_latency
+        self.cpu_affinity = cpu_affinity
+        self.rt_priority = rt_priority
         self.gst_process = None
         self._stop_event = threading.Event()
+        self.ready = threading.Event()
         
         # Statistics tracking
         self.stats_interval = stats_interval
@@ -69,15 +79,78 @@ class VideoForwarder(threading.Thread):
                     self.gst_warnings += 1
                     # Only log first few warnings to avoid spam
                     if self.gst_warnings <= 3:
-                        logger.warning(f"GStreamer: {line}")
+                        logger.warning("GStreamer: %s", line)
                 elif 'error' in line_lower or 'critical' in line_lower:
                     self.gst_errors += 1
-                    logger.error(f"GStreamer: {line}")
+                    logger.error("GStreamer: %s", line)
                 elif 'state change' in line_lower and 'playing' in line_lower:
                     logger.info("GStreamer pipeline state: PLAYING")
                     
         except Exception as e:
-            logger.debug(f"Error reading GStreamer stderr: {e}")
+            logger.debug("Error reading GStreamer stderr: %s", e)
+    
+    def _open_pidfd(self, pid):
+        """
+        Open a pidfd for the GStreamer process, if the platform supports it.
+        
+        Args:
+            pid: Process ID of the GStreamer pipeline
+            
+        Returns:
+            int or None: pidfd to wait on, or None to fall back to periodic polling
+        """
+        try:
+            return os.pidfd_open(pid)
+        except (OSError, AttributeError) as e:
+            logger.debug("pidfd unavailable, polling GStreamer instead: %s", e)
+            return None
+    
+    def _scheduling_prefix(self):
+        """
+        Build a command prefix that pins GStreamer to CPUs and/or gives it
+        real-time priority.
+        
+        taskset/chrt apply the settings before gst-launch is exec'd, so every
+        GStreamer thread inherits them. Both settings are opt-in; failures
+        (missing tool or privileges) are logged as warnings and streaming
+        continues with default scheduling.
+        
+        Returns:
+            list: Command prefix for gst-launch (empty if nothing applies)
+        """
+        prefix = []
+        if self.cpu_affinity:
+            cpus = ",".join(str(cpu) for cpu in sorted(self.cpu_affinity))
+            prefix += self._probe_scheduling_tool(["taskset", "-c", cpus], "CPU affinity")
+        if self.rt_priority:
+            prefix += self._probe_scheduling_tool(
+                ["chrt", "-f", str(self.rt_priority)], "real-time priority"
+            )
+        return prefix
+    
+    def _probe_scheduling_tool(self, tool_cmd, description):
+        """
+        Check that a scheduling wrapper works by running it on a no-op command.
+        
+        Args:
+            tool_cmd: Wrapper command without the program to run (e.g. chrt -f 10)
+            description: Setting name for log messages
+            
+        Returns:
+            list: tool_cmd if it works, otherwise an empty list
+        """
+        try:
+            result = subprocess.run(tool_cmd + ["true"], capture_output=True, text=True, timeout=5)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"⚠ Could not set GStreamer {description}: {e}")
+            return []
+        
+        if result.returncode != 0:
+            logger.warning(f"⚠ Could not set GStreamer {description}: {result.stderr.strip()}")
+            return []
+        
+        logger.info(f"GStreamer {description}: {' '.join(tool_cmd)}")
+        return tool_cmd
     
     def _build_low_latency_pipeline(self, drone_rtsp_url):
         """
@@ -168,7 +241,8 @@ class VideoForwarder(threading.Thread):
         if self.start_time is None:
             return
         
-        current_time = time.time()
+        # Monotonic clock: uptime and report spacing survive NTP/wall-clock steps
+        current_time = time.monotonic()
         
         # Check if it's time to report
         if self.last_stats_time is None or (current_time - self.last_stats_time) >= self.stats_interval:
@@ -215,7 +289,7 @@ class VideoForwarder(threading.Thread):
             pipeline = self._build_low_latency_pipeline(drone_rtsp_url)
         
         # Use system GStreamer (not Anaconda's old version)
-        cmd = ["/usr/bin/gst-launch-1.0", "-e"] + pipeline.split()
+        cmd = self._scheduling_prefix() + ["/usr/bin/gst-launch-1.0", "-e"] + pipeline.split()
         
         logger.info(f"Starting GStreamer pipeline")
         logger.info(f"Stream available at: srt://<your-ip>:{self.srt_port}")
@@ -237,41 +311,53 @@ class VideoForwarder(threading.Thread):
                 name="GStreamerStderrMonitor"
             )
             self.stderr_thread.start()
+            self.ready.set()
             
             logger.info(f"✓ SRT stream started on port {self.srt_port}")
             logger.info(f"  Input: {drone_rtsp_url}")
             logger.info(f"  Clients can connect: srt://<your-ip>:{self.srt_port}")
             
             # Initialize timing for status reports
-            self.start_time = time.time()
+            self.start_time = time.monotonic()
             self.last_stats_time = self.start_time
             
-            # Monitor GStreamer process
-            check_interval = 1  # Check every second
-            while not self._stop_event.is_set():
-                # Check if process is still running
-                if self.gst_process.poll() is not None:
-                    # Process terminated unexpectedly
-                    logger.error(f"✗ GStreamer process terminated unexpectedly (exit code: {self.gst_process.returncode})")
+            # Monitor GStreamer process. A pidfd (Linux 5.3+) becomes readable the
+            # moment GStreamer exits, so an unexpected exit is noticed at once
+            # instead of at the next check; the timeout still drives status reports.
+            check_interval = 1  # Status/stop check every second
+            process = self.gst_process
+            pidfd = self._open_pidfd(process.pid)
+            try:
+                while not self._stop_event.is_set():
+                    # Check if process is still running
+                    if process.poll() is not None:
+                        # Process terminated unexpectedly
+                        logger.error(f"✗ GStreamer process terminated unexpectedly (exit code: {process.returncode})")
+                        
+                        # Try to get remaining output
+                        try:
+                            remaining_stderr = process.stderr.read()
+                            if remaining_stderr:
+                                logger.error(f"Final GStreamer output: {remaining_stderr}")
+                        except:
+                            pass
+                        
+                        break
                     
-                    # Try to get remaining output
-                    try:
-                        remaining_stderr = self.gst_process.stderr.read()
-                        if remaining_stderr:
-                            logger.error(f"Final GStreamer output: {remaining_stderr}")
-                    except:
-                        pass
+                    # Log periodic status
+                    self._log_status()
                     
-                    break
-                
-                # Log periodic status
-                self._log_status()
-                
-                time.sleep(check_interval)
+                    if pidfd is not None:
+                        select.select([pidfd], [], [], check_interval)
+                    else:
+                        self._stop_event.wait(check_interval)
+            finally:
+                if pidfd is not None:
+                    os.close(pidfd)
             
             # Final status
             if self.start_time:
-                total_uptime = time.time() - self.start_time
+                total_uptime = time.monotonic() - self.start_time
                 uptime_str = time.strftime("%H:%M:%S", time.gmtime(total_uptime))
                 logger.info(f"Video streaming session ended - Total uptime: {uptime_str}")
                 
@@ -286,9 +372,9 @@ class VideoForwarder(threading.Thread):
             rtsp_url: RTSP URL to check
             timeout: Maximum time to wait in seconds
         """
-        start_time = time.time()
+        deadline = time.monotonic() + timeout
         
-        while time.time() - start_time < timeout:
+        while time.monotonic() < deadline:
             if self._stop_event.is_set():
                 return
                 
@@ -308,7 +394,9 @@ class VideoForwarder(threading.Thread):
             except (subprocess.TimeoutExpired, Exception):
                 pass
             
-            time.sleep(1)
+            # Retry after 1 s, returning at once if stop() is called meanwhile
+            if self._stop_event.wait(1):
+                return
         
         logger.warning("⚠ Drone video stream not available - proceeding anyway")
 